@@ -1,53 +1,188 @@
+import io
+import logging
 import traceback
 import os
-import shutil
-import tempfile
+import cv2
+import numpy as np
+from dotenv import load_dotenv
 from fastapi import UploadFile
-from nudenet import NudeDetector
-
-# Load NudeNet classifier once at startup
-path_640 = os.path.join(os.path.dirname(__file__), "640m.onnx")
-classifier = NudeDetector(model_path=path_640, inference_resolution=640)
-
-all_labels = [
-    "FEMALE_GENITALIA_COVERED",
-    "FACE_FEMALE",
-    "BUTTOCKS_EXPOSED",
-    "FEMALE_BREAST_EXPOSED",
-    "FEMALE_GENITALIA_EXPOSED",
-    "MALE_BREAST_EXPOSED",
-    "ANUS_EXPOSED",
-    "FEET_EXPOSED",
-    "BELLY_COVERED",
-    "FEET_COVERED",
-    "ARMPITS_COVERED",
-    "ARMPITS_EXPOSED",
-    "FACE_MALE",
-    "BELLY_EXPOSED",
-    "MALE_GENITALIA_EXPOSED",
-    "ANUS_COVERED",
-    "FEMALE_BREAST_COVERED",
-    "BUTTOCKS_COVERED",
-]
-
-naughty_labels = [
-    "BUTTOCKS_EXPOSED",
-    "FEMALE_BREAST_EXPOSED",
-    "FEMALE_GENITALIA_EXPOSED",
-    "ANUS_EXPOSED",
-    "MALE_GENITALIA_EXPOSED"
-]
-
-
-
-def run_inference(file: UploadFile):
-    suffix = os.path.splitext(file.filename)[1] or ".jpg"
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
-        shutil.copyfileobj(file.file, temp_file)
-        temp_path = temp_file.name
-    try:
-        results = classifier.detect(temp_path)
-    except Exception as e:
-        traceback.print_exc()
-        raise e
+
+from .admission import AdmissionController, Overloaded
+from .batching import ANONYMOUS, Priority
+from .cache import cache_from_env, cache_key
+from .labels import all_labels, naughty_labels
+from .registry import Detector, UnknownProfileError, registry_from_env
+from .singleflight import SingleFlight
+
+# Detector knobs are read at import time, which happens before app.main loads .env
+load_dotenv()
+
+# Load every configured model profile once at startup
+registry = registry_from_env()
+
+result_cache = cache_from_env()
+
+# Cross-worker coalescing hands results over through the shared cache tier
+_lock_dir = os.getenv("SINGLEFLIGHT_LOCK_DIR") or None
+if _lock_dir and not os.getenv("RESULT_CACHE_DB_URL"):
+    logging.getLogger("singleflight").warning(
+        "[singleflight] SINGLEFLIGHT_LOCK_DIR needs RESULT_CACHE_DB_URL; coalescing within each worker only"
+    )
+    _lock_dir = None
+inflight = SingleFlight(lock_dir=_lock_dir)
+
+# Bounds how much inference work this worker accepts at once
+admission = AdmissionController(
+    max_depth=int(os.getenv("INFERENCE_QUEUE_MAX_DEPTH", "64")),
+    anonymous_share=float(os.getenv("INFERENCE_QUEUE_ANON_SHARE", "0.75")),
+)
+
+# Profile used by isnude(fast=True) when the caller doesn't name one
+fast_profile = os.getenv("ISNUDE_FAST_PROFILE", "fast")
+
+
+class ImageDecodeError(ValueError):
+    """Raised when uploaded bytes cannot be decoded as an image."""
+
+
+def decode_image(data) -> np.ndarray:
+    """Decode bytes, a buffer or a file-like object into a BGR array, in memory.
+
+    Uses the same flags as ``cv2.imread`` so results match the old temp-file path.
+    Arrays are passed through unchanged.
+    """
+    if isinstance(data, np.ndarray):
+        return data
+    if hasattr(data, "read"):
+        data = data.read()
+    mat = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if mat is None:
+        raise ImageDecodeError("Could not decode image data")
+    return mat
+
+
+def read_upload(file: UploadFile):
+    """Return the upload's bytes, without copying when it is already in memory."""
+    if isinstance(file.file, io.BytesIO):
+        return file.file.getbuffer()
+    file.file.seek(0)
+    return file.file.read()
+
+
+def detect(image, detector: Detector = None, priority: Priority = ANONYMOUS):
+    """Detect on encoded bytes, a buffer, a file-like object or a decoded array."""
+    return (detector or registry.get()).detect(decode_image(image), priority)
+
+
+def is_nude(detections) -> bool:
+    return any(d["class"] in naughty_labels for d in detections)
+
+
+def detect_nude(image, detector: Detector = None, priority: Priority = ANONYMOUS) -> bool:
+    """Boolean-only detection: skips building the full detection list."""
+    return (detector or registry.get()).detect_nude(decode_image(image), priority)
+
+
+def _cached_single_flight(key: str, compute, priority: Priority):
+    cached = result_cache.get(key)
+    if cached is not None:
+        return cached
+
+    def run():
+        try:
+            with admission.slot(priority.tier):
+                result = compute()
+        except (ImageDecodeError, Overloaded):
+            raise
+        except Exception as e:
+            traceback.print_exc()
+            raise e
+        result_cache.put(key, result)
+        return result
+
+    # Identical concurrent uploads share one inference
+    return inflight.do(key, run, recheck=lambda: result_cache.get(key))
+
+
+def run_inference(file: UploadFile, detector: Detector = None, priority: Priority = ANONYMOUS):
+    return run_inference_bytes(read_upload(file), detector, priority)
+
+
+def run_inference_bytes(data, detector: Detector = None, priority: Priority = ANONYMOUS):
+    """Cached, coalesced detection on encoded image bytes."""
+    detector = detector or registry.get()
+    key = cache_key(data, detector.model, detector.resolution)
+    return _cached_single_flight(key, lambda: detect(data, detector, priority), priority)
+
+
+def run_isnude(
+    file: UploadFile,
+    fast: bool = False,
+    detector: Detector = None,
+    priority: Priority = ANONYMOUS,
+) -> bool:
+    return run_isnude_bytes(read_upload(file), fast, detector, priority)
+
+
+def run_isnude_bytes(
+    data,
+    fast: bool = False,
+    detector: Detector = None,
+    priority: Priority = ANONYMOUS,
+) -> bool:
+    """Cached, coalesced isnude verdict on encoded image bytes."""
+    detector = detector or registry.get(fast_profile if fast else None)
+    key = cache_key(data, f"{detector.model}/isnude", detector.resolution)
+    return _cached_single_flight(key, lambda: detect_nude(data, detector, priority), priority)
+
+
+def _run_batch(items, detector: Detector, priority: Priority, nude: bool) -> list:
+    """Run many encoded images as real batches, in input order.
+
+    Cached items are answered directly; the rest share one admission slot and
+    one submit to the batcher. An item that fails holds its exception instead
+    of a result.
+    """
+    model = f"{detector.model}/isnude" if nude else detector.model
+    keys = [cache_key(data, model, detector.resolution) for data in items]
+    results = [result_cache.get(key) for key in keys]
+    todo = [i for i, result in enumerate(results) if result is None]
+    if not todo:
+        return results
+
+    with admission.slot(priority.tier):
+        decoded = []
+        for i in todo:
+            try:
+                decoded.append((i, decode_image(items[i])))
+            except ImageDecodeError as e:
+                results[i] = e
+        if not decoded:
+            return results
+        mats = [mat for _, mat in decoded]
+        try:
+            outputs = detector.detect_nude_many(mats, priority) if nude else detector.detect_many(mats, priority)
+        except Overloaded:
+            raise
+        except Exception:
+            traceback.print_exc()
+            raise
+
+    for (i, _), output in zip(decoded, outputs):
+        results[i] = output
+        result_cache.put(keys[i], output)
     return results
+
+
+def run_inference_batch(files, detector: Detector = None, priority: Priority = ANONYMOUS) -> list:
+    return _run_batch([read_upload(f) for f in files], detector or registry.get(), priority, nude=False)
+
+
+def run_isnude_batch(
+    files,
+    fast: bool = False,
+    detector: Detector = None,
+    priority: Priority = ANONYMOUS,
+) -> list:
+    detector = detector or registry.get(fast_profile if fast else None)
+    return _run_batch([read_upload(f) for f in files], detector, priority, nude=True)
@@ -0,0 +1,90 @@
+"""
+Admission control for inference work.
+
+Requests that need the model take a slot before decoding; once
+``max_depth`` slots are taken, new work is refused immediately instead of
+queueing behind work the worker cannot finish in time. Anonymous callers may
+only fill ``anonymous_share`` of the slots, so API-token callers still get in
+when anonymous traffic saturates the worker. Requests that do get in but
+then wait longer than the batcher's maximum queue wait are dropped before
+inference (see MicroBatcher). Both surface as ``Overloaded``, which
+the API turns into 503 with Retry-After.
+
+Env knobs:
+  INFERENCE_QUEUE_MAX_DEPTH (default 64; per worker)
+  INFERENCE_QUEUE_ANON_SHARE (default 0.75; fraction of slots anonymous callers may hold)
+  INFERENCE_QUEUE_MAX_WAIT_MS (default 10000; enforced by the micro-batchers)
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Smoothing factor for the moving average of slot hold times
+_EWMA_ALPHA = 0.2
+
+
+class Overloaded(Exception):
+    """Raised when inference work is refused or expires in the queue."""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(self, max_depth: int = 64, anonymous_share: float = 1.0):
+        self.max_depth = max(1, int(max_depth))
+        self.anonymous_depth = max(1, int(self.max_depth * min(max(anonymous_share, 0.0), 1.0)))
+        self._lock = threading.Lock()
+        self._depth = 0
+        self._service_ewma = 0.0
+        self.admitted = 0
+        self.rejected = 0
+
+    def retry_after(self) -> int:
+        """Rough time for the current backlog to drain, in whole seconds (1..60)."""
+        with self._lock:
+            estimate = self._service_ewma * self._depth
+        return min(60, max(1, math.ceil(estimate)))
+
+    @contextmanager
+    def slot(self, priority_tier: int = 1):
+        limit = self.max_depth if priority_tier > 0 else self.anonymous_depth
+        with self._lock:
+            if self._depth >= limit:
+                self.rejected += 1
+                full = True
+            else:
+                self._depth += 1
+                self.admitted += 1
+                full = False
+        if full:
+            raise Overloaded("Inference queue is full", retry_after=self.retry_after())
+
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self._depth -= 1
+                if self._service_ewma:
+                    self._service_ewma += _EWMA_ALPHA * (elapsed - self._service_ewma)
+                else:
+                    self._service_ewma = elapsed
+
+    def depth(self) -> int:
+        return self._depth
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queue_depth": self._depth,
+                "max_depth": self.max_depth,
+                "anonymous_depth": self.anonymous_depth,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "avg_service_ms": self._service_ewma * 1000.0,
+            }
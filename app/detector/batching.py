@@ -0,0 +1,226 @@
+"""
+Dynamic micro-batching for ONNX inference.
+
+Concurrent callers submit preprocessed input blobs (shape ``(1, 3, H, W)``);
+a single background thread collects them into batches of up to
+``max_batch`` items, waiting at most ``max_wait_ms`` after the oldest queued
+item arrived, and runs one forward pass per batch. Each caller blocks on its
+own future and receives its own slice of the batched output.
+
+Blobs of different spatial sizes are never mixed in one batch: a batch is
+formed from the items sharing the shape of the oldest queued item.
+
+Items that waited longer than ``max_queue_wait_ms`` by the time their batch
+is formed fail with ``Overloaded`` instead of being run.
+
+Batches are filled in priority order rather than arrival order: API-token
+callers (tier 1) always go ahead of anonymous callers (tier 0), and within a
+tier flows share the model by weighted fair queueing, so a token with weight
+3 gets roughly three times the throughput of a weight-1 token when both are
+backlogged.
+"""
+
+import math
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from typing import Callable, List, Sequence
+
+import numpy as np
+
+from .admission import Overloaded
+
+
+class Priority:
+    """Scheduling class of a request: tier first, then weighted fair share within the tier."""
+
+    __slots__ = ("tier", "weight", "flow")
+
+    ANONYMOUS_TIER = 0
+    TOKEN_TIER = 1
+
+    def __init__(self, tier: int = ANONYMOUS_TIER, weight: float = 1.0, flow: str = "anonymous"):
+        self.tier = tier
+        self.weight = max(float(weight), 1e-3)
+        self.flow = flow
+
+    def as_tuple(self) -> tuple:
+        return (self.tier, self.weight, self.flow)
+
+
+ANONYMOUS = Priority()
+
+
+class _Pending:
+    __slots__ = ("blob", "future", "enqueued", "tier", "tag")
+
+    def __init__(self, blob: np.ndarray, tier: int, tag: float):
+        self.blob = blob
+        self.future: Future = Future()
+        self.enqueued = time.monotonic()
+        self.tier = tier
+        self.tag = tag
+
+    def order(self) -> tuple:
+        return (-self.tier, self.tag, self.enqueued)
+
+
+class MicroBatcher:
+    """Collects concurrent single-image requests into batched forward passes."""
+
+    def __init__(
+        self,
+        forward: Callable[[np.ndarray], np.ndarray],
+        max_batch: int = 4,
+        max_wait_ms: float = 10.0,
+        name: str = "default",
+        max_queue_wait_ms: float = 0.0,
+    ):
+        self._forward = forward
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_queue_wait = max(0.0, float(max_queue_wait_ms)) / 1000.0  # 0 = unbounded
+        self.name = name
+
+        self._queue: List[_Pending] = []
+        self._cond = threading.Condition()
+        # Weighted fair queueing state: virtual clock and last finish tag per flow
+        self._vtime = 0.0
+        self._flow_finish: dict = {}
+
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._images = 0
+        self._batch_sizes: Counter = Counter()
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._forward_total = 0.0
+        self._expired = 0
+
+        self._thread = threading.Thread(target=self._run, name=f"micro-batcher-{name}", daemon=True)
+        self._thread.start()
+
+    # -----------------------
+    # Public API
+    # -----------------------
+    def submit(self, blob: np.ndarray, priority: Priority = ANONYMOUS) -> np.ndarray:
+        """Queue one blob and block until its output row is available."""
+        return self.submit_many([blob], priority)[0]
+
+    def submit_many(self, blobs: Sequence[np.ndarray], priority: Priority = ANONYMOUS) -> List[np.ndarray]:
+        """Queue several blobs at once so they can share batches."""
+        with self._cond:
+            items = [_Pending(blob, priority.tier, self._finish_tag(priority)) for blob in blobs]
+            self._queue.extend(items)
+            self._cond.notify()
+        return [item.future.result() for item in items]
+
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            batches = self._batches
+            images = self._images
+            return {
+                "name": self.name,
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "queue_depth": len(self._queue),
+                "batches": batches,
+                "images": images,
+                "avg_batch_size": (images / batches) if batches else 0.0,
+                "batch_size_histogram": {str(k): v for k, v in sorted(self._batch_sizes.items())},
+                "avg_queue_wait_ms": (self._wait_total / images * 1000.0) if images else 0.0,
+                "max_queue_wait_ms": self._wait_max * 1000.0,
+                "avg_forward_ms": (self._forward_total / batches * 1000.0) if batches else 0.0,
+                "expired": self._expired,
+            }
+
+    # -----------------------
+    # Worker
+    # -----------------------
+    def _finish_tag(self, priority: Priority) -> float:
+        """Virtual finish time for one more item of this flow. Caller holds the lock."""
+        key = (priority.tier, priority.flow)
+        tag = max(self._vtime, self._flow_finish.get(key, 0.0)) + 1.0 / priority.weight
+        self._flow_finish[key] = tag
+        return tag
+
+    def _take_batch(self) -> List[_Pending]:
+        """Pop up to max_batch items, highest priority first, matching the head item's shape.
+
+        Caller holds the lock.
+        """
+        self._queue.sort(key=_Pending.order)
+        shape = self._queue[0].blob.shape[1:]
+        batch: List[_Pending] = []
+        rest: List[_Pending] = []
+        for item in self._queue:
+            if len(batch) < self.max_batch and item.blob.shape[1:] == shape:
+                batch.append(item)
+            else:
+                rest.append(item)
+        self._queue = rest
+
+        self._vtime = max(self._vtime, batch[-1].tag)
+        if len(self._flow_finish) > 1024:
+            # Flows that are fully served no longer affect anyone's tags
+            self._flow_finish = {k: v for k, v in self._flow_finish.items() if v > self._vtime}
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                deadline = min(item.enqueued for item in self._queue) + self.max_wait
+                while len(self._queue) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._take_batch()
+            batch = self._drop_expired(batch)
+            if batch:
+                self._execute(batch)
+
+    def _drop_expired(self, batch: List[_Pending]) -> List[_Pending]:
+        if not self.max_queue_wait:
+            return batch
+        now = time.monotonic()
+        live = []
+        for item in batch:
+            if now - item.enqueued > self.max_queue_wait:
+                item.future.set_exception(
+                    Overloaded("Timed out waiting for inference", retry_after=max(1, math.ceil(self.max_queue_wait)))
+                )
+                with self._stats_lock:
+                    self._expired += 1
+            else:
+                live.append(item)
+        return live
+
+    def _execute(self, batch: List[_Pending]) -> None:
+        started = time.monotonic()
+        try:
+            outputs = self._forward(np.concatenate([item.blob for item in batch], axis=0))
+        except BaseException as e:
+            for item in batch:
+                item.future.set_exception(e)
+            return
+        finished = time.monotonic()
+
+        with self._stats_lock:
+            self._batches += 1
+            self._images += len(batch)
+            self._batch_sizes[len(batch)] += 1
+            self._forward_total += finished - started
+            for item in batch:
+                waited = started - item.enqueued
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+
+        for i, item in enumerate(batch):
+            item.future.set_result(outputs[i : i + 1])
@@ -0,0 +1,236 @@
+"""
+Content-hash result cache for detector output.
+
+Keys are ``<model>:<resolution>:<sha256 of the image bytes>``; values are the
+JSON-encoded detection lists. Two tiers:
+
+- an in-process LRU bounded by entry count and encoded bytes;
+- an optional shared SQLite (or any SQLAlchemy URL) tier so every uvicorn
+  worker benefits from the others' work. Disk entries are evicted oldest-access
+  first once they exceed their own entry/byte caps.
+
+Env knobs:
+  RESULT_CACHE_MAX_ENTRIES (default 10000; 0 disables the memory tier)
+  RESULT_CACHE_MAX_BYTES (default 67108864)
+  RESULT_CACHE_DB_URL (default unset = no shared tier), e.g. sqlite:///./result_cache.db
+  RESULT_CACHE_DB_MAX_ENTRIES (default 1000000)
+  RESULT_CACHE_DB_MAX_BYTES (default 1073741824)
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from sqlalchemy import create_engine, event, text
+
+logger = logging.getLogger("result_cache")
+
+# Only refresh a disk entry's access time when it is older than this, so hot
+# keys don't turn every hit into a write.
+_TOUCH_INTERVAL_SEC = 60.0
+# Check disk-tier caps every N inserts rather than on every put.
+_EVICT_CHECK_EVERY = 64
+
+
+def cache_key(data, model: str, resolution: int) -> str:
+    return f"{model}:{resolution}:{hashlib.sha256(data).hexdigest()}"
+
+
+class ResultCache:
+    """Bounded LRU in memory, optionally backed by a shared SQL table."""
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        max_bytes: int = 64 * 1024 * 1024,
+        db_url: Optional[str] = None,
+        db_max_entries: int = 1_000_000,
+        db_max_bytes: int = 1024 * 1024 * 1024,
+    ):
+        self.max_entries = max(0, int(max_entries))
+        self.max_bytes = max(0, int(max_bytes))
+        self.db_max_entries = max(1, int(db_max_entries))
+        self.db_max_bytes = max(1, int(db_max_bytes))
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._puts_since_check = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+        self._engine = None
+        if db_url:
+            try:
+                self._engine = self._open_db(db_url)
+            except Exception as e:
+                logger.warning("[cache] shared tier disabled, could not open %s: %s", db_url, e)
+                self._engine = None
+
+    # -----------------------
+    # Public API
+    # -----------------------
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            raw = self._entries.get(key)
+            if raw is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return json.loads(raw)
+
+        raw = self._db_get(key)
+        if raw is not None:
+            self._remember(key, raw)
+            with self._lock:
+                self.disk_hits += 1
+            return json.loads(raw)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value: Any) -> None:
+        raw = json.dumps(value, separators=(",", ":")).encode()
+        self._remember(key, raw)
+        self._db_put(key, raw)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": ((self.memory_hits + self.disk_hits) / lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+                "shared_tier": self._engine is not None,
+                "disk_evictions": self.disk_evictions,
+            }
+
+    # -----------------------
+    # Memory tier
+    # -----------------------
+    def _remember(self, key: str, raw: bytes) -> None:
+        if not self.max_entries or len(raw) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = raw
+            self._bytes += len(raw)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    # -----------------------
+    # Shared tier
+    # -----------------------
+    @staticmethod
+    def _open_db(db_url: str):
+        connect_args = {"check_same_thread": False, "timeout": 5} if db_url.startswith("sqlite") else {}
+        engine = create_engine(db_url, connect_args=connect_args)
+        if db_url.startswith("sqlite"):
+            @event.listens_for(engine, "connect")
+            def _sqlite_pragmas(dbapi_conn, _):  # type: ignore[unused-variable]
+                cur = dbapi_conn.cursor()
+                cur.execute("PRAGMA journal_mode=WAL")
+                cur.execute("PRAGMA synchronous=NORMAL")
+                cur.close()
+        with engine.begin() as conn:
+            conn.execute(text(
+                "CREATE TABLE IF NOT EXISTS result_cache ("
+                " key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+            ))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_result_cache_accessed ON result_cache (accessed)"))
+        return engine
+
+    def _db_get(self, key: str) -> Optional[bytes]:
+        if self._engine is None:
+            return None
+        try:
+            with self._engine.connect() as conn:
+                row = conn.execute(
+                    text("SELECT value, accessed FROM result_cache WHERE key = :k"), {"k": key}
+                ).first()
+                if not row:
+                    return None
+                now = time.time()
+                if now - row[1] > _TOUCH_INTERVAL_SEC:
+                    conn.execute(text("UPDATE result_cache SET accessed = :a WHERE key = :k"), {"a": now, "k": key})
+                    conn.commit()
+                return bytes(row[0])
+        except Exception as e:
+            logger.debug("[cache] shared get failed: %s", e)
+            return None
+
+    def _db_put(self, key: str, raw: bytes) -> None:
+        if self._engine is None:
+            return
+        try:
+            with self._engine.begin() as conn:
+                conn.execute(
+                    text(
+                        "INSERT OR REPLACE INTO result_cache (key, value, size, accessed) VALUES (:k, :v, :s, :a)"
+                    ),
+                    {"k": key, "v": raw, "s": len(raw), "a": time.time()},
+                )
+        except Exception as e:
+            logger.debug("[cache] shared put failed: %s", e)
+            return
+
+        with self._lock:
+            self._puts_since_check += 1
+            if self._puts_since_check < _EVICT_CHECK_EVERY:
+                return
+            self._puts_since_check = 0
+        self._db_evict()
+
+    def _db_evict(self) -> None:
+        try:
+            with self._engine.begin() as conn:
+                count, total = conn.execute(
+                    text("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM result_cache")
+                ).first()
+                if count <= self.db_max_entries and total <= self.db_max_bytes:
+                    return
+                # Trim ~10% below the caps so we don't evict on every check.
+                excess = max(count - int(self.db_max_entries * 0.9), 0)
+                if total > self.db_max_bytes and count:
+                    avg = total / count
+                    excess = max(excess, int((total - self.db_max_bytes * 0.9) / avg) + 1)
+                deleted = conn.execute(
+                    text(
+                        "DELETE FROM result_cache WHERE key IN "
+                        "(SELECT key FROM result_cache ORDER BY accessed LIMIT :n)"
+                    ),
+                    {"n": excess},
+                ).rowcount
+            with self._lock:
+                self.disk_evictions += max(deleted or 0, 0)
+        except Exception as e:
+            logger.debug("[cache] shared eviction failed: %s", e)
+
+
+def cache_from_env() -> ResultCache:
+    return ResultCache(
+        max_entries=int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "10000")),
+        max_bytes=int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+        db_url=os.getenv("RESULT_CACHE_DB_URL") or None,
+        db_max_entries=int(os.getenv("RESULT_CACHE_DB_MAX_ENTRIES", "1000000")),
+        db_max_bytes=int(os.getenv("RESULT_CACHE_DB_MAX_BYTES", str(1024 * 1024 * 1024))),
+    )
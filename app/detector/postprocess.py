@@ -0,0 +1,65 @@
+"""
+Boolean post-processing for the isnude fast path.
+
+``nudenet``'s ``_postprocess`` walks every anchor in Python, builds a box for
+every class and runs class-agnostic NMS before anyone can ask "is any of
+these naughty?". ``has_detection_of`` answers that question directly and
+returns the same verdict as scanning ``_postprocess`` output:
+
+- anchors are scored with array ops instead of a Python loop;
+- if no anchor of a wanted class clears the NMS score threshold, stop;
+- if the best-scoring anchor overall is wanted, it always survives NMS, stop;
+- otherwise only anchors scoring at least as high as the weakest wanted
+  candidate can suppress one, so NMS runs on that subset alone.
+"""
+
+from typing import Sequence
+
+import cv2
+import numpy as np
+
+# Same thresholds nudenet hands to cv2.dnn.NMSBoxes
+NMS_SCORE_THRESHOLD = 0.25
+NMS_IOU_THRESHOLD = 0.45
+
+
+def has_detection_of(
+    output,
+    class_ids: Sequence[int],
+    x_pad: int,
+    y_pad: int,
+    image_original_width: int,
+    image_original_height: int,
+    model_width: int,
+    model_height: int,
+) -> bool:
+    rows = np.transpose(np.squeeze(output[0]))
+    scores = rows[:, 4:]
+    best_class = scores.argmax(axis=1)
+    best_score = scores[np.arange(len(scores)), best_class]
+
+    # cv2.dnn.NMSBoxes only keeps scores strictly above its threshold
+    wanted = np.isin(best_class, class_ids) & (best_score > NMS_SCORE_THRESHOLD)
+    if not wanted.any():
+        return False
+    if wanted[int(best_score.argmax())]:
+        return True
+
+    subset = np.nonzero(best_score >= best_score[wanted].min())[0]
+    x, y, w, h = (rows[subset, i] for i in range(4))
+
+    # Mirrors nudenet's per-anchor arithmetic so NMS sees identical boxes
+    x = x - w / 2
+    y = y - h / 2
+    x = x * (image_original_width + x_pad) / model_width
+    y = y * (image_original_height + y_pad) / model_height
+    w = w * (image_original_width + x_pad) / model_width
+    h = h * (image_original_height + y_pad) / model_height
+    x = np.clip(x, 0, image_original_width)
+    y = np.clip(y, 0, image_original_height)
+    w = np.minimum(w, image_original_width - x)
+    h = np.minimum(h, image_original_height - y)
+
+    boxes = np.stack([x, y, w, h], axis=1).tolist()
+    kept = cv2.dnn.NMSBoxes(boxes, best_score[subset].tolist(), NMS_SCORE_THRESHOLD, NMS_IOU_THRESHOLD)
+    return any(wanted[subset[int(i)]] for i in np.asarray(kept).reshape(-1))
@@ -0,0 +1,230 @@
+"""
+Registry of preloaded detector profiles.
+
+A profile is a model file plus an input resolution, e.g. ``fast`` = 640m.onnx
+at 320 px and ``accurate`` = 640m.onnx at 640 px. Every profile is loaded at
+startup and has its own micro-batcher (batches never mix resolutions);
+profiles that share a model file share one ONNX session.
+
+Env knobs:
+  DETECTOR_PROFILES (default "accurate=640m.onnx@640,fast=640m.onnx@320")
+      comma-separated name=model@resolution; model names are looked up next
+      to this file first, then in the nudenet package (which ships 320n.onnx)
+  DETECTOR_DEFAULT_PROFILE (default "accurate")
+  INFERENCE_MAX_BATCH (default 4; 1 disables batching)
+  INFERENCE_MAX_WAIT_MS (default 10; how long the oldest request may wait for company)
+  INFERENCE_MODE (local|client|server, default local; see server.py)
+  INFERENCE_QUEUE_MAX_WAIT_MS (default 10000; see admission.py)
+"""
+
+import os
+from typing import Dict, List, Optional, Sequence
+
+import nudenet
+import numpy as np
+import onnxruntime
+from nudenet.nudenet import _read_image, _postprocess
+
+from .batching import ANONYMOUS, MicroBatcher, Priority
+from .labels import naughty_ids
+from .postprocess import has_detection_of
+from .server import RemoteBatcher
+from .session import log_settings, session_options_from_env
+
+DEFAULT_PROFILES = "accurate=640m.onnx@640,fast=640m.onnx@320"
+
+
+class UnknownProfileError(ValueError):
+    """Raised when a request names a profile or resolution that isn't loaded."""
+
+
+def _resolve_model_path(model: str) -> str:
+    if os.path.isabs(model):
+        return model
+    for base in (os.path.dirname(__file__), os.path.dirname(nudenet.__file__)):
+        candidate = os.path.join(base, model)
+        if os.path.exists(candidate):
+            return candidate
+    return os.path.join(os.path.dirname(__file__), model)
+
+
+def parse_profiles(spec: str) -> List[tuple]:
+    """Parse ``name=model@resolution,...`` into (name, model, resolution) tuples."""
+    profiles = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            name, rest = part.split("=", 1)
+            model, resolution = rest.rsplit("@", 1)
+            profiles.append((name.strip(), model.strip(), int(resolution)))
+        except ValueError:
+            raise ValueError(f"Invalid DETECTOR_PROFILES entry {part!r}; expected name=model@resolution")
+    if not profiles:
+        raise ValueError("DETECTOR_PROFILES defines no profiles")
+    return profiles
+
+
+class Detector:
+    """One preloaded model variant: a session, an input resolution and a batcher."""
+
+    def __init__(
+        self,
+        name: str,
+        model_path: str,
+        resolution: int,
+        session=None,
+        max_batch: int = 4,
+        max_wait_ms: float = 10.0,
+        batcher=None,
+        max_queue_wait_ms: float = 0.0,
+    ):
+        self.name = name
+        self.model_path = model_path
+        self.model = os.path.splitext(os.path.basename(model_path))[0]
+        self.resolution = resolution
+        self.session = session
+        if batcher is None:
+            self.input_name = session.get_inputs()[0].name
+            batcher = MicroBatcher(
+                self._forward,
+                max_batch=max_batch,
+                max_wait_ms=max_wait_ms,
+                name=name,
+                max_queue_wait_ms=max_queue_wait_ms,
+            )
+        self.batcher = batcher
+
+    def _forward(self, batch: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: batch})[0]
+
+    def detect(self, mat: np.ndarray, priority: Priority = ANONYMOUS) -> list:
+        return self.detect_many([mat], priority)[0]
+
+    def detect_nude(self, mat: np.ndarray, priority: Priority = ANONYMOUS) -> bool:
+        """Boolean-only detection: skips building the full detection list."""
+        return self.detect_nude_many([mat], priority)[0]
+
+    def _run_many(self, mats: Sequence[np.ndarray], priority: Priority) -> list:
+        """Preprocess every image and push them through the batcher together."""
+        prepared = [_read_image(mat, self.resolution) for mat in mats]
+        outputs = self.batcher.submit_many([p[0] for p in prepared], priority)
+        return list(zip(outputs, prepared))
+
+    def detect_many(self, mats: Sequence[np.ndarray], priority: Priority = ANONYMOUS) -> List[list]:
+        results = []
+        for output, (_, x_ratio, y_ratio, x_pad, y_pad, width, height) in self._run_many(mats, priority):
+            results.append(_postprocess(
+                [output],
+                x_pad,
+                y_pad,
+                x_ratio,
+                y_ratio,
+                width,
+                height,
+                self.resolution,
+                self.resolution,
+            ))
+        return results
+
+    def detect_nude_many(self, mats: Sequence[np.ndarray], priority: Priority = ANONYMOUS) -> List[bool]:
+        results = []
+        for output, (_, _, _, x_pad, y_pad, width, height) in self._run_many(mats, priority):
+            results.append(has_detection_of(
+                output,
+                naughty_ids,
+                x_pad,
+                y_pad,
+                width,
+                height,
+                self.resolution,
+                self.resolution,
+            ))
+        return results
+
+    def describe(self) -> dict:
+        return {"name": self.name, "model": self.model, "resolution": self.resolution}
+
+
+class DetectorRegistry:
+    def __init__(
+        self,
+        profiles: List[tuple],
+        default: str,
+        max_batch: int = 4,
+        max_wait_ms: float = 10.0,
+        session_options: Optional[onnxruntime.SessionOptions] = None,
+        remote: bool = False,
+        max_queue_wait_ms: float = 0.0,
+    ):
+        sessions: Dict[str, object] = {}
+        self.detectors: Dict[str, Detector] = {}
+        self.remote = remote
+        for name, model, resolution in profiles:
+            path = _resolve_model_path(model)
+            if remote:
+                # Model lives in the inference server; only keep the metadata here
+                self.detectors[name] = Detector(name, path, resolution, batcher=RemoteBatcher(name))
+                continue
+            if path not in sessions:
+                sessions[path] = onnxruntime.InferenceSession(path, sess_options=session_options)
+            self.detectors[name] = Detector(
+                name,
+                path,
+                resolution,
+                sessions[path],
+                max_batch,
+                max_wait_ms,
+                max_queue_wait_ms=max_queue_wait_ms,
+            )
+        if default not in self.detectors:
+            raise ValueError(f"DETECTOR_DEFAULT_PROFILE {default!r} is not one of {list(self.detectors)}")
+        self.default = default
+
+    def get(self, profile: Optional[str] = None, resolution: Optional[int] = None) -> Detector:
+        """Pick a detector by profile name, else by resolution, else the default."""
+        if profile:
+            try:
+                return self.detectors[profile]
+            except KeyError:
+                raise UnknownProfileError(f"Unknown profile {profile!r}; available: {', '.join(self.detectors)}")
+        if resolution:
+            # Prefer the default profile's model when several profiles share a resolution
+            matches = [d for d in self.detectors.values() if d.resolution == resolution]
+            if not matches:
+                available = sorted({d.resolution for d in self.detectors.values()})
+                raise UnknownProfileError(f"Unsupported resolution {resolution}; available: {available}")
+            default = self.detectors[self.default]
+            return next((d for d in matches if d.model == default.model), matches[0])
+        return self.detectors[self.default]
+
+    def describe(self) -> dict:
+        return {
+            "default": self.default,
+            "profiles": [d.describe() for d in self.detectors.values()],
+        }
+
+    def stats(self) -> dict:
+        return {name: d.batcher.stats() for name, d in self.detectors.items()}
+
+
+def registry_from_env() -> DetectorRegistry:
+    mode = os.getenv("INFERENCE_MODE", "local").strip().lower()
+    if mode not in {"local", "client", "server"}:
+        raise ValueError(f"INFERENCE_MODE must be local, client or server, got {mode!r}")
+    profiles = parse_profiles(os.getenv("DETECTOR_PROFILES", DEFAULT_PROFILES))
+    default = os.getenv("DETECTOR_DEFAULT_PROFILE", "accurate")
+    if mode == "client":
+        return DetectorRegistry(profiles, default, remote=True)
+
+    session_options, settings = session_options_from_env()
+    log_settings(settings)
+    return DetectorRegistry(
+        profiles,
+        default,
+        max_batch=int(os.getenv("INFERENCE_MAX_BATCH", "4")),
+        max_wait_ms=float(os.getenv("INFERENCE_MAX_WAIT_MS", "10")),
+        session_options=session_options,
+        max_queue_wait_ms=float(os.getenv("INFERENCE_QUEUE_MAX_WAIT_MS", "10000")),
+    )
@@ -0,0 +1,236 @@
+"""
+Shared-model inference server.
+
+By default every uvicorn worker loads its own copy of each model. With
+``INFERENCE_MODE=client`` the workers load nothing: they decode and
+preprocess uploads themselves, copy the input tensors into a shared-memory
+segment and ask a single inference process (``INFERENCE_MODE=server``,
+started with ``pdm run inference-server``) to run them. The server owns the
+ONNX sessions and the micro-batchers, so requests from every worker are
+batched together and model memory no longer scales with the worker count.
+
+Wire protocol (multiprocessing.connection over a Unix socket):
+  ("run", profile, priority, shm_name, shapes) -> ("ok", [outputs]) | ("overloaded", retry_after) | ("error", message)
+  ("stats", profile)                 -> ("ok", stats)     | ("error", message)
+
+Env knobs:
+  INFERENCE_MODE (local|client|server, default local)
+  INFERENCE_SERVER_SOCKET (default /tmp/nsfw_inference.sock)
+  INFERENCE_SERVER_AUTHKEY (optional shared secret for the socket)
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+from multiprocessing import resource_tracker
+from multiprocessing.connection import Client, Listener
+from multiprocessing.shared_memory import SharedMemory
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from .admission import Overloaded
+from .batching import ANONYMOUS, Priority
+
+logger = logging.getLogger("uvicorn.error")
+
+DEFAULT_SOCKET = "/tmp/nsfw_inference.sock"
+
+
+def server_address() -> str:
+    return os.getenv("INFERENCE_SERVER_SOCKET", DEFAULT_SOCKET)
+
+
+def _authkey() -> Optional[bytes]:
+    key = os.getenv("INFERENCE_SERVER_AUTHKEY")
+    return key.encode() if key else None
+
+
+def _attach(name: str) -> SharedMemory:
+    """Attach to a client's segment without letting this process's resource tracker own it."""
+    try:
+        return SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13
+        shm = SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class InferenceServerError(RuntimeError):
+    """Raised in workers when the inference server is unreachable or fails a request."""
+
+
+# -----------------------
+# Client side (HTTP workers)
+# -----------------------
+class _Channel:
+    """One connection plus the shared-memory segment it sends pixel buffers through."""
+
+    def __init__(self, address: str):
+        self.conn = Client(address, family="AF_UNIX", authkey=_authkey())
+        self.shm: Optional[SharedMemory] = None
+
+    def buffer(self, nbytes: int) -> SharedMemory:
+        if self.shm is None or self.shm.size < nbytes:
+            self.release_shm()
+            self.shm = SharedMemory(create=True, size=nbytes)
+        return self.shm
+
+    def release_shm(self) -> None:
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def close(self) -> None:
+        try:
+            self.conn.close()
+        finally:
+            self.release_shm()
+
+
+class RemoteBatcher:
+    """Drop-in for MicroBatcher that forwards tensors to the inference server."""
+
+    def __init__(self, profile: str, address: Optional[str] = None):
+        self.name = profile
+        self.address = address or server_address()
+        self._channels: "queue.LifoQueue[_Channel]" = queue.LifoQueue()
+        atexit.register(self.close)
+
+    def close(self) -> None:
+        """Close pooled connections and unlink their shared-memory segments."""
+        while True:
+            try:
+                channel = self._channels.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                channel.close()
+            except Exception:
+                pass
+
+    def _request(self, message: tuple, blobs: Sequence[np.ndarray] = ()):
+        try:
+            channel = self._channels.get_nowait()
+        except queue.Empty:
+            try:
+                channel = _Channel(self.address)
+            except OSError as e:
+                raise InferenceServerError(f"Inference server unavailable at {self.address}: {e}")
+
+        try:
+            if blobs:
+                shm = channel.buffer(sum(blob.nbytes for blob in blobs))
+                offset = 0
+                for blob in blobs:
+                    view = np.ndarray(blob.shape, dtype=np.float32, buffer=shm.buf, offset=offset)
+                    view[...] = blob
+                    offset += view.nbytes
+                message = message + (shm.name, [tuple(blob.shape) for blob in blobs])
+            channel.conn.send(message)
+            status, payload = channel.conn.recv()
+        except (OSError, EOFError) as e:
+            channel.close()
+            raise InferenceServerError(f"Inference server connection failed: {e}")
+        self._channels.put(channel)
+
+        if status == "overloaded":
+            raise Overloaded("Inference server is overloaded", retry_after=payload)
+        if status != "ok":
+            raise InferenceServerError(payload)
+        return payload
+
+    def submit(self, blob: np.ndarray, priority: Priority = ANONYMOUS) -> np.ndarray:
+        return self.submit_many([blob], priority)[0]
+
+    def submit_many(self, blobs: Sequence[np.ndarray], priority: Priority = ANONYMOUS) -> List[np.ndarray]:
+        return self._request(("run", self.name, priority.as_tuple()), blobs)
+
+    def queue_depth(self) -> int:
+        return self.stats().get("queue_depth", 0)
+
+    def stats(self) -> dict:
+        try:
+            stats = self._request(("stats", self.name))
+        except InferenceServerError as e:
+            return {"name": self.name, "remote": self.address, "error": str(e)}
+        stats["remote"] = self.address
+        return stats
+
+
+# -----------------------
+# Server side (dedicated process)
+# -----------------------
+def _handle(conn, registry) -> None:
+    attached: Optional[SharedMemory] = None
+    try:
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                return
+            try:
+                kind, profile = message[0], message[1]
+                detector = registry.get(profile)
+                if kind == "stats":
+                    conn.send(("ok", detector.batcher.stats()))
+                    continue
+                if kind != "run":
+                    raise ValueError(f"Unknown request {kind!r}")
+
+                priority, shm_name, shapes = Priority(*message[2]), message[3], message[4]
+                if attached is None or attached.name != shm_name.lstrip("/"):
+                    if attached is not None:
+                        attached.close()
+                    attached = _attach(shm_name)
+                views = []
+                offset = 0
+                for shape in shapes:
+                    view = np.ndarray(shape, dtype=np.float32, buffer=attached.buf, offset=offset)
+                    views.append(view)
+                    offset += view.nbytes
+                outputs = detector.batcher.submit_many(views, priority)
+                del views
+                conn.send(("ok", outputs))
+            except Overloaded as e:
+                conn.send(("overloaded", e.retry_after))
+            except Exception as e:
+                logger.exception("[inference-server] request failed")
+                conn.send(("error", str(e)))
+    finally:
+        if attached is not None:
+            attached.close()
+        conn.close()
+
+
+def serve(address: Optional[str] = None) -> None:
+    from . import registry
+
+    address = address or server_address()
+    if os.path.exists(address):
+        os.unlink(address)
+    listener = Listener(address, family="AF_UNIX", authkey=_authkey())
+    os.chmod(address, 0o600)
+    logger.info("[inference-server] pid=%s serving %s on %s", os.getpid(), list(registry.detectors), address)
+    try:
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                logger.warning("[inference-server] accept failed: %s", e)
+                continue
+            threading.Thread(target=_handle, args=(conn, registry), name="inference-conn", daemon=True).start()
+    finally:
+        listener.close()
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    serve()
+
+
+if __name__ == "__main__":
+    main()
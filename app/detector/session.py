@@ -0,0 +1,109 @@
+"""
+ONNX Runtime session configuration.
+
+`pdm run serve` starts several uvicorn workers and each one owns its own
+session, so ORT's defaults (one intra-op thread per core, spinning threads)
+oversubscribe the box. Thread counts default to cores / workers instead.
+
+Env knobs:
+  SERVE_WORKERS (exported by `pdm run serve`; default 1; ignored by the inference server)
+  ORT_INTRA_OP_THREADS (default max(1, cores // SERVE_WORKERS))
+  ORT_INTER_OP_THREADS (default 1; only used by the parallel execution mode)
+  ORT_EXECUTION_MODE (sequential|parallel, default sequential)
+  ORT_GRAPH_OPT_LEVEL (disable|basic|extended|all, default all)
+  ORT_ENABLE_CPU_MEM_ARENA (default 1)
+  ORT_ENABLE_MEM_PATTERN (default 1)
+  ORT_ALLOW_SPINNING (default 1 with a single worker, 0 otherwise)
+"""
+
+import logging
+import os
+from typing import Tuple
+
+import onnxruntime
+
+# uvicorn configures this logger, so the startup line shows up in service logs
+logger = logging.getLogger("uvicorn.error")
+
+_OPT_LEVELS = {
+    "disable": onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+_EXECUTION_MODES = {
+    "sequential": onnxruntime.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": onnxruntime.ExecutionMode.ORT_PARALLEL,
+}
+
+
+def _env_flag(name: str, default: str) -> bool:
+    return str(os.getenv(name, default)).strip().lower() in {"1", "true", "yes", "on"}
+
+
+def _cpu_count() -> int:
+    try:
+        return len(os.sched_getaffinity(0)) or 1
+    except (AttributeError, OSError):
+        return os.cpu_count() or 1
+
+
+def session_options_from_env() -> Tuple[onnxruntime.SessionOptions, dict]:
+    """Build SessionOptions from env and return them with a summary of the effective values."""
+    cores = _cpu_count()
+    workers = max(1, int(os.getenv("SERVE_WORKERS") or 1))
+    if os.getenv("INFERENCE_MODE", "local").strip().lower() == "server":
+        # The shared inference process is the only model owner on the box
+        workers = 1
+    intra = int(os.getenv("ORT_INTRA_OP_THREADS") or max(1, cores // workers))
+    inter = int(os.getenv("ORT_INTER_OP_THREADS") or 1)
+
+    mode_name = os.getenv("ORT_EXECUTION_MODE", "sequential").strip().lower()
+    opt_name = os.getenv("ORT_GRAPH_OPT_LEVEL", "all").strip().lower()
+    if mode_name not in _EXECUTION_MODES:
+        raise ValueError(f"ORT_EXECUTION_MODE must be one of {list(_EXECUTION_MODES)}, got {mode_name!r}")
+    if opt_name not in _OPT_LEVELS:
+        raise ValueError(f"ORT_GRAPH_OPT_LEVEL must be one of {list(_OPT_LEVELS)}, got {opt_name!r}")
+
+    arena = _env_flag("ORT_ENABLE_CPU_MEM_ARENA", "1")
+    mem_pattern = _env_flag("ORT_ENABLE_MEM_PATTERN", "1")
+    spinning = _env_flag("ORT_ALLOW_SPINNING", "1" if workers == 1 else "0")
+
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = intra
+    options.inter_op_num_threads = inter
+    options.execution_mode = _EXECUTION_MODES[mode_name]
+    options.graph_optimization_level = _OPT_LEVELS[opt_name]
+    options.enable_cpu_mem_arena = arena
+    options.enable_mem_pattern = mem_pattern
+    options.add_session_config_entry("session.intra_op.allow_spinning", "1" if spinning else "0")
+    options.add_session_config_entry("session.inter_op.allow_spinning", "1" if spinning else "0")
+
+    settings = {
+        "cores": cores,
+        "workers": workers,
+        "intra_op_threads": intra,
+        "inter_op_threads": inter,
+        "execution_mode": mode_name,
+        "graph_optimization_level": opt_name,
+        "cpu_mem_arena": arena,
+        "mem_pattern": mem_pattern,
+        "allow_spinning": spinning,
+    }
+    return options, settings
+
+
+def log_settings(settings: dict) -> None:
+    logger.info(
+        "[ORT] pid=%s cores=%d workers=%d intra_op_threads=%d inter_op_threads=%d mode=%s opt=%s arena=%s mem_pattern=%s spinning=%s",
+        os.getpid(),
+        settings["cores"],
+        settings["workers"],
+        settings["intra_op_threads"],
+        settings["inter_op_threads"],
+        settings["execution_mode"],
+        settings["graph_optimization_level"],
+        settings["cpu_mem_arena"],
+        settings["mem_pattern"],
+        settings["allow_spinning"],
+    )
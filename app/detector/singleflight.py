@@ -0,0 +1,110 @@
+"""
+Single-flight coalescing of identical in-flight detection work.
+
+Within a worker, concurrent calls with the same key share one execution: the
+first caller (the leader) runs the function, everyone else waits on its future.
+
+Across workers, when a lock directory is configured, the leader also takes an
+exclusive flock on a per-key-bucket lock file. A leader in another worker that
+has to wait for that lock re-checks the shared result cache once it gets it,
+so the image is only inferred once per box. This relies on the shared cache
+tier (RESULT_CACHE_DB_URL) to hand results between processes.
+
+Env knobs:
+  SINGLEFLIGHT_LOCK_DIR (default unset = per-worker only)
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+
+try:
+    import fcntl  # POSIX-only; used for cross-process coordination
+except Exception:  # pragma: no cover
+    fcntl = None
+
+logger = logging.getLogger("singleflight")
+
+# Lock files are bucketed so the directory stays bounded (16**4 files max).
+_BUCKET_HEX_CHARS = 4
+
+
+class SingleFlight:
+    def __init__(self, lock_dir: Optional[str] = None):
+        if lock_dir and fcntl is None:
+            logger.info("[singleflight] fcntl not available; coalescing within this worker only")
+            lock_dir = None
+        if lock_dir:
+            os.makedirs(lock_dir, exist_ok=True)
+        self.lock_dir = lock_dir
+
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.shared_hits = 0
+
+    def do(self, key: str, fn: Callable[[], Any], recheck: Optional[Callable[[], Any]] = None) -> Any:
+        """Run ``fn`` once per key among concurrent callers and return its result to all of them.
+
+        ``recheck`` is consulted after waiting on another worker's lock; a non-None
+        value is returned instead of running ``fn``.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            result = self._lead(key, fn, recheck)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "shared_hits": self.shared_hits,
+                "cross_worker": self.lock_dir is not None,
+            }
+
+    def _lead(self, key: str, fn: Callable[[], Any], recheck: Optional[Callable[[], Any]]) -> Any:
+        if not self.lock_dir:
+            return fn()
+
+        bucket = hashlib.sha1(key.encode()).hexdigest()[:_BUCKET_HEX_CHARS]
+        fd = os.open(os.path.join(self.lock_dir, f"{bucket}.lock"), os.O_CREAT | os.O_RDWR, 0o600)
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Another worker is (probably) inferring the same image; wait, then reuse its result.
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                if recheck is not None:
+                    result = recheck()
+                    if result is not None:
+                        with self._lock:
+                            self.shared_hits += 1
+                        return result
+            return fn()
+        finally:
+            os.close(fd)
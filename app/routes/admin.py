@@ -6,7 +6,7 @@ from dotenv import load_dotenv
 
 from fastapi import APIRouter, Depends, Form, HTTPException
 from fastapi.responses import HTMLResponse
-from sqlalchemy import Boolean, Column, DateTime, Integer, String, create_engine
+from sqlalchemy import Boolean, Column, DateTime, Integer, String, create_engine, inspect, text
 from sqlalchemy.orm import Session, declarative_base, sessionmaker
 
 from .auth import require_admin
@@ -33,10 +33,17 @@ class ApiToken(Base):
     token = Column(String, unique=True, index=True, nullable=False)
     active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Share of inference capacity relative to other tokens when the box is saturated
+    weight = Column(Integer, default=1, nullable=False, server_default="1")
 
 
 Base.metadata.create_all(bind=engine)
 
+# create_all doesn't add columns to existing tables; patch older token DBs in place
+if "weight" not in {c["name"] for c in inspect(engine).get_columns("api_tokens")}:
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE api_tokens ADD COLUMN weight INTEGER NOT NULL DEFAULT 1"))
+
 router = APIRouter()
 
 
@@ -93,6 +100,12 @@ def admin_home(db: Session = Depends(get_db), user=Depends(require_admin)):
         f"<td>{t.email}</td>"
         f"<td><code>{t.token}</code></td>"
         f"<td>{'active' if t.active else 'disabled'}</td>"
+        f"<td>"
+        f"  <form method='post' action='/admin/tokens/{t.id}/weight' style='display:inline'>"
+        f"    <input name='weight' type='number' min='1' max='100' value='{t.weight or 1}' style='width:5em'>"
+        f"    <button>Set</button>"
+        f"  </form>"
+        f"</td>"
         f"<td>{t.created_at:%Y-%m-%d %H:%M:%S}</td>"
         f"<td>"
         f"  <form method='post' action='/admin/tokens/{t.id}/toggle' style='display:inline'>"
@@ -108,6 +121,7 @@ def admin_home(db: Session = Depends(get_db), user=Depends(require_admin)):
   <h2>Create new token</h2>
   <form method="post" action="/admin/tokens/new">
     <label>Email <input name="email" type="email" required></label>
+    <label>Weight <input name="weight" type="number" min="1" max="100" value="1"></label>
     <button type="submit">Create</button>
   </form>
 </section>
@@ -116,10 +130,10 @@ def admin_home(db: Session = Depends(get_db), user=Depends(require_admin)):
   <h2>Existing tokens</h2>
   <table>
     <thead>
-      <tr><th>ID</th><th>Email</th><th>Token</th><th>Status</th><th>Created</th><th>Action</th></tr>
+      <tr><th>ID</th><th>Email</th><th>Token</th><th>Status</th><th>Weight</th><th>Created</th><th>Action</th></tr>
     </thead>
     <tbody>
-      {rows or '<tr><td colspan="6">No tokens yet</td></tr>'}
+      {rows or '<tr><td colspan="7">No tokens yet</td></tr>'}
     </tbody>
   </table>
 </section>
@@ -139,10 +153,15 @@ def admin_home(db: Session = Depends(get_db), user=Depends(require_admin)):
 
 
 @router.post("/admin/tokens/new", response_class=HTMLResponse)
-def create_token(email: str = Form(...), db: Session = Depends(get_db), user=Depends(require_admin)):
+def create_token(
+    email: str = Form(...),
+    weight: int = Form(1),
+    db: Session = Depends(get_db),
+    user=Depends(require_admin),
+):
     # Simple token generator; shown once on success
     token = "sk_" + secrets.token_urlsafe(24)
-    rec = ApiToken(email=email, token=token, active=True)
+    rec = ApiToken(email=email, token=token, active=True, weight=max(1, weight))
     db.add(rec)
     db.commit()
 
@@ -167,4 +186,24 @@ def toggle_token(token_id: int, db: Session = Depends(get_db), user=Depends(requ
 <p>Token for <code>{rec.email}</code> is now <strong>{status}</strong>.</p>
 <p><a href="/admin">Back to tokens</a></p>
 """
-    return _page("Token Updated", body)
\ No newline at end of file
+    return _page("Token Updated", body)
+
+
+@router.post("/admin/tokens/{token_id}/weight", response_class=HTMLResponse)
+def set_token_weight(
+    token_id: int,
+    weight: int = Form(...),
+    db: Session = Depends(get_db),
+    user=Depends(require_admin),
+):
+    rec: Optional[ApiToken] = db.query(ApiToken).get(token_id)
+    if not rec:
+        raise HTTPException(status_code=404, detail="Not found")
+    rec.weight = max(1, weight)
+    db.commit()
+
+    body = f"""
+<p>Token for <code>{rec.email}</code> now has weight <strong>{rec.weight}</strong>.</p>
+<p><a href="/admin">Back to tokens</a></p>
+"""
+    return _page("Token Updated", body)
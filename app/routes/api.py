@@ -1,15 +1,38 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Depends
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Depends, Request, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 
-from ..utils.rate_limiter import limit_token_or_ip
+from ..utils.multipart_stream import iter_parts, multipart_boundary
+from ..utils.rate_limiter import limit_token_or_ip, charge_extra
 
-from ..detector import run_inference, all_labels, naughty_labels
+from ..detector import (
+    run_inference,
+    run_isnude,
+    run_inference_batch,
+    run_isnude_batch,
+    run_inference_bytes,
+    run_isnude_bytes,
+    read_upload,
+    all_labels,
+    naughty_labels,
+    registry,
+    result_cache,
+    inflight,
+    admission,
+    ImageDecodeError,
+    Overloaded,
+    Priority,
+    UnknownProfileError,
+)
 
+import asyncio
 import base64
 import io
+import json
+import os
 import re
-from typing import Optional
-from starlette.datastructures import UploadFile as StarletteUploadFile
+from typing import List, Optional
+from starlette.datastructures import Headers, UploadFile as StarletteUploadFile
 
 router = APIRouter()
 
@@ -32,13 +55,25 @@ def _upload_from_b64(b64_str: str) -> StarletteUploadFile:
 
     bio = io.BytesIO(raw)
     bio.seek(0)
-    return StarletteUploadFile(filename="upload", file=bio, content_type=mime)
+    return StarletteUploadFile(filename="upload", file=bio, headers=Headers({"content-type": mime}))
+
+
+# Helper: scheduling priority for the caller identified by limit_token_or_ip
+def _priority(request: Request) -> Priority:
+    key = getattr(request.state, "rate_key", "anonymous")
+    weight = getattr(request.state, "token_weight", None)
+    if weight is None:
+        return Priority(Priority.ANONYMOUS_TIER, 1.0, key)
+    return Priority(Priority.TOKEN_TIER, weight, key)
 
 
 @router.post("/detect", dependencies=[Depends(limit_token_or_ip)])
 def detect(
+    request: Request,
     file: Optional[UploadFile] = File(None),
     file_b64: Optional[str] = Form(None),
+    profile: Optional[str] = Form(None),
+    resolution: Optional[int] = Form(None),
 ):
     try:
         upload: Optional[UploadFile] = file
@@ -48,18 +83,26 @@ def detect(
             else:
                 raise HTTPException(status_code=422, detail="Missing file upload or file_b64 form field")
 
-        results = run_inference(upload)
+        results = run_inference(upload, registry.get(profile, resolution), _priority(request))
         return JSONResponse(content=results)
     except HTTPException:
         raise
+    except (ImageDecodeError, UnknownProfileError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/isnude", dependencies=[Depends(limit_token_or_ip)])
 def isnude(
+    request: Request,
     file: Optional[UploadFile] = File(None),
     file_b64: Optional[str] = Form(None),
+    fast: bool = Form(False),
+    profile: Optional[str] = Form(None),
+    resolution: Optional[int] = Form(None),
 ):
     try:
         upload: Optional[UploadFile] = file
@@ -69,16 +112,245 @@ def isnude(
             else:
                 raise HTTPException(status_code=422, detail="Missing file upload or file_b64 form field")
 
-        results = run_inference(upload)
-        for label in results:
-            if label['class'] in naughty_labels:
-                return JSONResponse(content={"nude": True})
-        return JSONResponse(content={"nude": False})
+        detector = registry.get(profile, resolution) if (profile or resolution) else None
+        nude = run_isnude(upload, fast=fast, detector=detector, priority=_priority(request))
+        return JSONResponse(content={"nude": nude})
     except HTTPException:
         raise
+    except (ImageDecodeError, UnknownProfileError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Helper: gather every image of a batch request, in order (files first, then file_b64)
+def _batch_uploads(files: Optional[List[UploadFile]], file_b64: Optional[List[str]]) -> List[UploadFile]:
+    uploads: List[UploadFile] = list(files or [])
+    uploads.extend(_upload_from_b64(b64) for b64 in (file_b64 or []) if b64)
+    if not uploads:
+        raise HTTPException(status_code=422, detail="Missing files uploads or file_b64 form fields")
+    max_images = int(os.getenv("BATCH_MAX_IMAGES", "200"))
+    if len(uploads) > max_images:
+        raise HTTPException(status_code=422, detail=f"Too many images in one batch (max {max_images})")
+    return uploads
+
+
+def _batch_response(results: list, field: str) -> JSONResponse:
+    items = []
+    for index, result in enumerate(results):
+        if isinstance(result, Exception):
+            items.append({"index": index, "error": str(result)})
+        else:
+            items.append({"index": index, field: result})
+    return JSONResponse(content={"results": items})
+
+
+@router.post("/detect_batch", dependencies=[Depends(limit_token_or_ip)])
+def detect_batch(
+    request: Request,
+    files: Optional[List[UploadFile]] = File(None),
+    file_b64: Optional[List[str]] = Form(None),
+    profile: Optional[str] = Form(None),
+    resolution: Optional[int] = Form(None),
+):
+    try:
+        uploads = _batch_uploads(files, file_b64)
+        detector = registry.get(profile, resolution)
+        # The dependency already counted one image
+        charge_extra(request, len(uploads) - 1)
+        results = run_inference_batch(uploads, detector, _priority(request))
+        return _batch_response(results, "detections")
+    except HTTPException:
+        raise
+    except UnknownProfileError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/isnude_batch", dependencies=[Depends(limit_token_or_ip)])
+def isnude_batch(
+    request: Request,
+    files: Optional[List[UploadFile]] = File(None),
+    file_b64: Optional[List[str]] = Form(None),
+    fast: bool = Form(False),
+    profile: Optional[str] = Form(None),
+    resolution: Optional[int] = Form(None),
+):
+    try:
+        uploads = _batch_uploads(files, file_b64)
+        detector = registry.get(profile, resolution) if (profile or resolution) else None
+        charge_extra(request, len(uploads) - 1)
+        results = run_isnude_batch(uploads, fast=fast, detector=detector, priority=_priority(request))
+        return _batch_response(results, "nude")
+    except HTTPException:
+        raise
+    except UnknownProfileError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# -----------------------
+# Streaming batches
+# -----------------------
+# Helper: NDJSON unless the caller asks for SSE via ?format=sse or Accept: text/event-stream
+def _stream_format(request: Request, fmt: Optional[str]) -> str:
+    if fmt:
+        fmt = fmt.strip().lower()
+        if fmt not in ("ndjson", "sse"):
+            raise HTTPException(status_code=422, detail="format must be 'ndjson' or 'sse'")
+        return fmt
+    return "sse" if "text/event-stream" in request.headers.get("accept", "") else "ndjson"
+
+
+def _stream_line(fmt: str, event: str, payload: dict) -> bytes:
+    data = json.dumps(payload, separators=(",", ":"))
+    if fmt == "sse":
+        return f"event: {event}\ndata: {data}\n\n".encode()
+    return (data + "\n").encode()
+
+
+def _stream_response(request: Request, boundary: bytes, fmt: str, infer, field: str) -> StreamingResponse:
+    """Run each image part as soon as it has arrived and emit results in completion order.
+
+    Image parts are ``file``/``files`` uploads or ``file_b64`` fields. At most
+    STREAM_MAX_PENDING images are in flight; past that the body is not read
+    further, which pushes back on the client instead of buffering uploads.
+    The first image was charged by limit_token_or_ip, every further one is
+    charged as it arrives; once the caller runs out the stream ends with an
+    error line for that image.
+    """
+    max_pending = max(1, int(os.getenv("STREAM_MAX_PENDING", "8")))
+    max_part_bytes = int(os.getenv("STREAM_MAX_PART_BYTES", str(25 * 1024 * 1024)))
+    out: asyncio.Queue = asyncio.Queue()
+    slots = asyncio.Semaphore(max_pending)
+
+    async def work(index: int, data) -> None:
+        try:
+            line = {"index": index, field: await run_in_threadpool(infer, data)}
+        except Overloaded as e:
+            line = {"index": index, "error": str(e), "retry_after": e.retry_after}
+        except Exception as e:
+            line = {"index": index, "error": str(e)}
+        finally:
+            slots.release()
+        await out.put(line)
+
+    async def read() -> None:
+        tasks = []
+        index = 0
+        try:
+            async for part in iter_parts(request, boundary, max_part_bytes):
+                if part.name not in ("file", "files", "file_b64"):
+                    continue
+                if part.data is None:
+                    await out.put({"index": index, "error": f"Image exceeds {max_part_bytes} bytes"})
+                    index += 1
+                    continue
+                if part.name == "file_b64":
+                    if not part.data.strip():
+                        continue
+                    try:
+                        data = read_upload(_upload_from_b64(part.data.decode("ascii", "replace")))
+                    except HTTPException as e:
+                        await out.put({"index": index, "error": e.detail})
+                        index += 1
+                        continue
+                else:
+                    data = bytes(part.data)
+
+                if index:
+                    try:
+                        charge_extra(request, 1)
+                    except HTTPException as e:
+                        await out.put({"index": index, "error": e.detail})
+                        break
+                await slots.acquire()
+                tasks.append(asyncio.create_task(work(index, data)))
+                index += 1
+        except Exception as e:
+            await out.put({"error": f"Could not read upload: {e}"})
+        finally:
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await out.put({"done": True, "count": index})
+
+    async def generate():
+        reader = asyncio.create_task(read())
+        try:
+            while True:
+                line = await out.get()
+                if line.get("done"):
+                    yield _stream_line(fmt, "done", line)
+                    return
+                yield _stream_line(fmt, "result", line)
+        finally:
+            reader.cancel()
+
+    media_type = "text/event-stream" if fmt == "sse" else "application/x-ndjson"
+    return StreamingResponse(generate(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
+
+@router.post("/detect_stream", dependencies=[Depends(limit_token_or_ip)])
+async def detect_stream(
+    request: Request,
+    profile: Optional[str] = Query(None),
+    resolution: Optional[int] = Query(None),
+    format: Optional[str] = Query(None),
+):
+    # Options come from the query string: the body is only read as images arrive
+    try:
+        boundary = multipart_boundary(request)
+        fmt = _stream_format(request, format)
+        detector = registry.get(profile, resolution)
+    except UnknownProfileError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    priority = _priority(request)
+    return _stream_response(
+        request, boundary, fmt, lambda data: run_inference_bytes(data, detector, priority), "detections"
+    )
+
+
+@router.post("/isnude_stream", dependencies=[Depends(limit_token_or_ip)])
+async def isnude_stream(
+    request: Request,
+    fast: bool = Query(False),
+    profile: Optional[str] = Query(None),
+    resolution: Optional[int] = Query(None),
+    format: Optional[str] = Query(None),
+):
+    try:
+        boundary = multipart_boundary(request)
+        fmt = _stream_format(request, format)
+        detector = registry.get(profile, resolution) if (profile or resolution) else None
+    except UnknownProfileError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    priority = _priority(request)
+    return _stream_response(
+        request, boundary, fmt, lambda data: run_isnude_bytes(data, fast, detector, priority), "nude"
+    )
+
+
 @router.get("/list_labels")
 async def list_labels():
-    return JSONResponse(content={"all_labels": all_labels, 'naughty_labels': naughty_labels})
\ No newline at end of file
+    return JSONResponse(content={"all_labels": all_labels, 'naughty_labels': naughty_labels})
+
+
+@router.get("/stats")
+async def stats():
+    return JSONResponse(content={
+        "admission": admission.stats(),
+        "batching": registry.stats(),
+        "cache": result_cache.stats(),
+        "singleflight": inflight.stats(),
+    })
+
+
+@router.get("/profiles")
+async def profiles():
+    return JSONResponse(content=registry.describe())
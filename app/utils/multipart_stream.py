@@ -0,0 +1,105 @@
+"""
+Incremental multipart/form-data parsing.
+
+FastAPI's ``File``/``Form`` parameters read the whole body before the
+handler runs. Streaming endpoints instead iterate ``request.stream()``
+through python-multipart's callback parser and get each part as soon as its
+closing boundary arrives, so only the part being received (plus whatever the
+caller still holds) is in memory.
+"""
+
+from typing import AsyncIterator, List, Optional
+
+from fastapi import HTTPException, Request
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ModuleNotFoundError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+
+class Part:
+    """One completed form part. ``data`` is None when the part exceeded the size cap."""
+
+    __slots__ = ("name", "filename", "content_type", "data", "size")
+
+    def __init__(self):
+        self.name: str = ""
+        self.filename: Optional[str] = None
+        self.content_type: str = ""
+        self.data: Optional[bytearray] = bytearray()
+        self.size = 0
+
+
+def multipart_boundary(request: Request) -> bytes:
+    """Boundary of a multipart/form-data request; 422 for any other body."""
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=422, detail="Expected a multipart/form-data body")
+    return boundary
+
+
+async def iter_parts(request: Request, boundary: bytes, max_part_bytes: int) -> AsyncIterator[Part]:
+    """Yield form parts in body order while the body is still arriving."""
+    done: List[Part] = []
+    state = {"part": None, "field": b"", "value": b"", "headers": {}}
+
+    def on_part_begin():
+        state["part"] = Part()
+        state["headers"] = {}
+
+    def on_header_field(data, start, end):
+        state["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][state["field"].lower()] = state["value"]
+        state["field"] = b""
+        state["value"] = b""
+
+    def on_headers_finished():
+        part = state["part"]
+        _, options = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        part.name = options.get(b"name", b"").decode("utf-8", "replace")
+        if b"filename" in options:
+            part.filename = options[b"filename"].decode("utf-8", "replace")
+        part.content_type = state["headers"].get(b"content-type", b"").decode("latin-1")
+
+    def on_part_data(data, start, end):
+        part = state["part"]
+        part.size += end - start
+        if part.data is None:
+            return
+        if part.size > max_part_bytes:
+            # Keep counting but stop buffering; the caller reports the item as too large
+            part.data = None
+            return
+        part.data += data[start:end]
+
+    def on_part_end():
+        done.append(state["part"])
+        state["part"] = None
+
+    parser = MultipartParser(
+        boundary,
+        {
+            "on_part_begin": on_part_begin,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+        },
+    )
+
+    async for chunk in request.stream():
+        parser.write(chunk)
+        while done:
+            yield done.pop(0)
+    parser.finalize()
+    while done:
+        yield done.pop(0)
@@ -34,8 +34,8 @@ class FileRateLimiter:
     def __init__(self, filepath):
         self.filepath = filepath
     
-    def is_allowed(self, key: str, limit: int, window: int) -> bool:
-        """Check if request is allowed and record it."""
+    def is_allowed(self, key: str, limit: int, window: int, cost: int = 1) -> bool:
+        """Check if `cost` requests are allowed and record them."""
         now = time.time()
         cutoff = now - window
         
@@ -56,11 +56,11 @@ class FileRateLimiter:
                 data[key] = [ts for ts in data[key] if ts > cutoff]
                 
                 # Check if we're within limit
-                if len(data[key]) >= limit:
+                if len(data[key]) + cost > limit:
                     return False
                 
                 # Record this request
-                data[key].append(now)
+                data[key].extend([now] * cost)
                 
                 # Write back
                 f.seek(0)
@@ -71,9 +71,11 @@ class FileRateLimiter:
                 
         except FileNotFoundError:
             # Create file if it doesn't exist
+            if cost > limit:
+                return False
             with open(self.filepath, 'w') as f:
                 fcntl.flock(f.fileno(), fcntl.LOCK_EX)
-                json.dump({key: [now]}, f)
+                json.dump({key: [now] * cost}, f)
             return True
 
 # Storage backend (configurable)
@@ -122,20 +124,27 @@ def _extract_token(x_api_key: Optional[str], authorization: Optional[str]) -> Op
     return None
 
 
-def _is_valid_token(token: str) -> bool:
+def _token_weight(token: str) -> Optional[int]:
+    """Scheduling weight of an active token, or None if the token is unknown/disabled."""
     try:
         with _tokens_engine.connect() as conn:
-            row = conn.execute(text("SELECT active FROM api_tokens WHERE token = :t"), {"t": token}).first()
+            row = conn.execute(
+                text("SELECT active, weight FROM api_tokens WHERE token = :t"), {"t": token}
+            ).first()
     except Exception:
         # If the token DB is unavailable, treat as anonymous rather than 500
-        return False
-    if not row:
-        return False
-    return bool(row[0])
+        return None
+    if not row or not row[0]:
+        return None
+    return max(1, int(row[1] or 1))
+
+
+def _is_valid_token(token: str) -> bool:
+    return _token_weight(token) is not None
 
 
-def _hit_or_429(rate_item, key: str) -> None:
-    """Consume one request for `key` against `rate_item`; raise 429 if exceeded."""
+def _hit_or_429(rate_item, key: str, cost: int = 1) -> None:
+    """Consume `cost` requests for `key` against `rate_item`; raise 429 if exceeded."""
     if _is_file_limiter:
         # Extract limit and window from rate_item string representation
         rate_str = str(rate_item)  # e.g., "2 per 60 second"
@@ -143,11 +152,11 @@ def _hit_or_429(rate_item, key: str) -> None:
         limit = int(parts[0])
         window = int(parts[2])
         
-        if not _limiter.is_allowed(key, limit, window):
+        if not _limiter.is_allowed(key, limit, window, cost):
             raise HTTPException(status_code=429, detail="Rate limit exceeded")
     else:
         # Use limits library limiter
-        if not _limiter.hit(rate_item, key):
+        if not _limiter.hit(rate_item, key, cost=cost):
             raise HTTPException(status_code=429, detail="Rate limit exceeded")
 
 
@@ -163,16 +172,36 @@ async def limit_token_or_ip(
 
     - If a valid API token is present → apply TOKEN rate per token.
     - Otherwise → apply IP rate per IP.
+
+    Records the caller on ``request.state`` (``rate_key``, ``token_weight``;
+    weight is None for anonymous callers) for the inference scheduler.
     """
     ip_rate, token_rate = _current_rates()
 
     token = _extract_token(x_api_key, authorization)
-    if token and _is_valid_token(token):
-        _hit_or_429(token_rate, f"tok:{token}")
+    weight = _token_weight(token) if token else None
+    if weight is not None:
+        request.state.rate_key = f"tok:{token}"
+        request.state.rate_item = token_rate
+        request.state.token_weight = weight
+        _hit_or_429(token_rate, request.state.rate_key)
         return
     # Anonymous path: limit by IP
     ip = request.client.host if request.client else "unknown"
-    _hit_or_429(ip_rate, f"ip:{ip}")
+    request.state.rate_key = f"ip:{ip}"
+    request.state.rate_item = ip_rate
+    request.state.token_weight = None
+    _hit_or_429(ip_rate, request.state.rate_key)
+
+
+def charge_extra(request: Request, cost: int) -> None:
+    """Consume `cost` more hits for a caller already admitted by limit_token_or_ip.
+
+    Batch endpoints use this so limits count images rather than requests.
+    """
+    if cost <= 0:
+        return
+    _hit_or_429(request.state.rate_item, request.state.rate_key, cost)
 
 
 async def limit_by_ip(request: Request) -> None:
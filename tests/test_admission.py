@@ -0,0 +1,54 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.detector.admission import AdmissionController, Overloaded
+from app.detector.batching import MicroBatcher
+
+
+def test_slots_beyond_max_depth_are_refused():
+    controller = AdmissionController(max_depth=2)
+    with controller.slot():
+        with controller.slot():
+            assert controller.depth() == 2
+            with pytest.raises(Overloaded) as exc:
+                with controller.slot():
+                    pass
+            assert exc.value.retry_after >= 1
+    assert controller.depth() == 0
+    stats = controller.stats()
+    assert stats["admitted"] == 2
+    assert stats["rejected"] == 1
+
+
+def test_items_waiting_past_max_queue_wait_expire():
+    release = threading.Event()
+
+    def slow(batch):
+        release.wait()
+        return batch
+
+    batcher = MicroBatcher(slow, max_batch=1, max_wait_ms=0, name="expiry", max_queue_wait_ms=20)
+    blob = np.zeros((1, 3, 2, 2), dtype=np.float32)
+    first = threading.Thread(target=batcher.submit, args=(blob,))
+    first.start()
+    time.sleep(0.01)
+
+    errors = []
+
+    def late():
+        try:
+            batcher.submit(blob)
+        except Overloaded as e:
+            errors.append(e)
+
+    second = threading.Thread(target=late)
+    second.start()
+    time.sleep(0.05)
+    release.set()
+    first.join()
+    second.join()
+    assert len(errors) == 1
+    assert batcher.stats()["expired"] == 1
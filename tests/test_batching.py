@@ -0,0 +1,122 @@
+import threading
+import time
+
+import numpy as np
+
+from app.detector.batching import MicroBatcher
+
+
+def _double(batch):
+    time.sleep(0.01)
+    return batch * 2
+
+
+def test_concurrent_submits_share_batches():
+    batcher = MicroBatcher(_double, max_batch=4, max_wait_ms=50, name="test")
+    results = {}
+
+    def call(i):
+        results[i] = batcher.submit(np.full((1, 3, 2, 2), i, dtype=np.float32))
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    for i in range(8):
+        assert results[i].shape == (1, 3, 2, 2)
+        assert float(results[i][0, 0, 0, 0]) == i * 2
+    stats = batcher.stats()
+    assert stats["images"] == 8
+    assert stats["batches"] < 8
+    assert stats["avg_batch_size"] > 1
+
+
+def test_mixed_shapes_are_not_batched_together():
+    batcher = MicroBatcher(_double, max_batch=8, max_wait_ms=20, name="shapes")
+    outs = batcher.submit_many([
+        np.ones((1, 3, 2, 2), dtype=np.float32),
+        np.ones((1, 3, 4, 4), dtype=np.float32),
+    ])
+    assert outs[0].shape == (1, 3, 2, 2)
+    assert outs[1].shape == (1, 3, 4, 4)
+    assert batcher.stats()["batches"] == 2
+
+
+def test_forward_errors_reach_every_caller():
+    def boom(batch):
+        raise RuntimeError("boom")
+
+    batcher = MicroBatcher(boom, max_batch=2, max_wait_ms=1, name="errors")
+    try:
+        batcher.submit(np.zeros((1, 3, 2, 2), dtype=np.float32))
+    except RuntimeError as e:
+        assert str(e) == "boom"
+    else:
+        raise AssertionError("expected RuntimeError")
+
+
+def test_token_tier_is_served_before_anonymous():
+    from app.detector.batching import Priority
+
+    gate = threading.Event()
+    order = []
+
+    def record(batch):
+        gate.wait()
+        order.extend(int(v) for v in batch[:, 0, 0, 0])
+        return batch
+
+    batcher = MicroBatcher(record, max_batch=1, max_wait_ms=0, name="priority")
+    blob = lambda v: np.full((1, 3, 2, 2), v, dtype=np.float32)
+
+    # Occupy the worker so the rest queue up behind it
+    threads = [threading.Thread(target=batcher.submit, args=(blob(0),))]
+    threads[0].start()
+    time.sleep(0.02)
+    anon = Priority(Priority.ANONYMOUS_TIER, 1, "ip:1")
+    token = Priority(Priority.TOKEN_TIER, 1, "tok:a")
+    for value, prio in [(1, anon), (2, anon), (3, token)]:
+        t = threading.Thread(target=batcher.submit, args=(blob(value), prio))
+        t.start()
+        threads.append(t)
+        time.sleep(0.01)
+    gate.set()
+    for t in threads:
+        t.join()
+    assert order == [0, 3, 1, 2]
+
+
+def test_weights_share_capacity_within_a_tier():
+    from app.detector.batching import Priority
+
+    gate = threading.Event()
+    order = []
+
+    def record(batch):
+        gate.wait()
+        order.extend(int(v) for v in batch[:, 0, 0, 0])
+        return batch
+
+    batcher = MicroBatcher(record, max_batch=1, max_wait_ms=0, name="weights")
+    blob = lambda v: np.full((1, 3, 2, 2), v, dtype=np.float32)
+    first = threading.Thread(target=batcher.submit, args=(blob(0),))
+    first.start()
+    time.sleep(0.02)
+
+    heavy = Priority(Priority.TOKEN_TIER, 3, "tok:heavy")
+    light = Priority(Priority.TOKEN_TIER, 1, "tok:light")
+    threads = [
+        threading.Thread(target=batcher.submit_many, args=([blob(1)] * 6, heavy)),
+        threading.Thread(target=batcher.submit_many, args=([blob(2)] * 2, light)),
+    ]
+    for t in threads:
+        t.start()
+    time.sleep(0.02)
+    gate.set()
+    first.join()
+    for t in threads:
+        t.join()
+    # The weight-3 flow gets three slots for each one of the weight-1 flow
+    assert order[1:5].count(1) == 3
@@ -0,0 +1,53 @@
+from app.detector.cache import ResultCache, cache_key
+
+
+def test_key_depends_on_bytes_model_and_resolution():
+    a = cache_key(b"abc", "640m", 640)
+    assert a == cache_key(memoryview(b"abc"), "640m", 640)
+    assert a != cache_key(b"abd", "640m", 640)
+    assert a != cache_key(b"abc", "320n", 640)
+    assert a != cache_key(b"abc", "640m", 320)
+
+
+def test_memory_tier_is_lru_bounded_by_entries():
+    cache = ResultCache(max_entries=2, max_bytes=1 << 20)
+    cache.put("a", [1])
+    cache.put("b", [2])
+    assert cache.get("a") == [1]
+    cache.put("c", [3])
+    assert cache.get("b") is None
+    assert cache.get("a") == [1]
+    assert cache.get("c") == [3]
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["memory_hits"] == 3
+    assert stats["misses"] == 1
+    assert stats["evictions"] == 1
+
+
+def test_memory_tier_is_bounded_by_bytes():
+    cache = ResultCache(max_entries=100, max_bytes=40)
+    for i in range(10):
+        cache.put(str(i), [{"class": "FACE_FEMALE", "score": i}])
+    assert cache.stats()["bytes"] <= 40
+
+
+def test_shared_tier_is_visible_to_other_instances(tmp_path):
+    url = f"sqlite:///{tmp_path / 'cache.db'}"
+    first = ResultCache(max_entries=10, db_url=url)
+    second = ResultCache(max_entries=10, db_url=url)
+    first.put("k", [{"class": "FACE_MALE", "score": 0.9, "box": [1, 2, 3, 4]}])
+    assert second.get("k") == [{"class": "FACE_MALE", "score": 0.9, "box": [1, 2, 3, 4]}]
+    assert second.stats()["disk_hits"] == 1
+    assert second.get("k") is not None
+    assert second.stats()["memory_hits"] == 1
+
+
+def test_shared_tier_evicts_oldest_past_entry_cap(tmp_path):
+    url = f"sqlite:///{tmp_path / 'cache.db'}"
+    cache = ResultCache(max_entries=0, db_url=url, db_max_entries=10)
+    for i in range(64):
+        cache.put(f"k{i}", [i])
+    assert cache.stats()["disk_evictions"] > 0
+    assert cache.get("k0") is None
+    assert cache.get("k63") == [63]
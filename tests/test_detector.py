@@ -0,0 +1,72 @@
+import io
+
+import pytest
+from fastapi import UploadFile
+from nudenet import NudeDetector
+
+from app.detector import (
+    ImageDecodeError,
+    UnknownProfileError,
+    decode_image,
+    detect,
+    registry,
+    run_inference,
+    run_inference_batch,
+    run_isnude_batch,
+)
+from app.detector.registry import parse_profiles
+
+
+def test_in_memory_detect_matches_path_detect():
+    path = "tests/fixtures/nude_sample_1.jpg"
+    with open(path, "rb") as f:
+        data = f.read()
+    default = registry.get()
+    expected = NudeDetector(model_path=default.model_path, inference_resolution=default.resolution).detect(path)
+    assert detect(data) == expected
+    assert detect(memoryview(data)) == expected
+    assert detect(decode_image(data)) == expected
+    assert run_inference(UploadFile(filename="test.jpg", file=io.BytesIO(data))) == expected
+
+
+def test_undecodable_upload_raises_decode_error():
+    with pytest.raises(ImageDecodeError):
+        detect(b"definitely not an image")
+
+
+def test_parse_profiles():
+    assert parse_profiles("fast=320n.onnx@320, accurate=640m.onnx@640") == [
+        ("fast", "320n.onnx", 320),
+        ("accurate", "640m.onnx", 640),
+    ]
+    with pytest.raises(ValueError):
+        parse_profiles("fast=320n.onnx")
+
+
+def test_registry_routes_by_profile_and_resolution():
+    for d in registry.detectors.values():
+        assert registry.get(d.name) is d
+        assert registry.get(resolution=d.resolution).resolution == d.resolution
+    assert registry.get() is registry.detectors[registry.default]
+    with pytest.raises(UnknownProfileError):
+        registry.get("no-such-profile")
+    with pytest.raises(UnknownProfileError):
+        registry.get(resolution=12345)
+
+
+def test_batch_results_are_in_order_with_per_item_errors():
+    datas = []
+    for i in (1, 2, 3):
+        with open(f"tests/fixtures/nude_sample_{i}.jpg", "rb") as f:
+            datas.append(f.read())
+    uploads = [UploadFile(filename=f"{i}.jpg", file=io.BytesIO(d)) for i, d in enumerate(datas)]
+    uploads.insert(1, UploadFile(filename="bad.jpg", file=io.BytesIO(b"not an image")))
+
+    results = run_inference_batch(uploads)
+    assert len(results) == 4
+    assert isinstance(results[1], ImageDecodeError)
+    assert [results[0], results[2], results[3]] == [detect(d) for d in datas]
+
+    verdicts = run_isnude_batch(uploads)
+    assert isinstance(verdicts[1], ImageDecodeError)
+    assert all(isinstance(v, bool) for i, v in enumerate(verdicts) if i != 1)
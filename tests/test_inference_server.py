@@ -0,0 +1,60 @@
+import threading
+from multiprocessing.connection import Listener
+
+import numpy as np
+import pytest
+
+from app.detector.batching import MicroBatcher
+from app.detector.server import InferenceServerError, RemoteBatcher, _handle
+
+
+class _FakeDetector:
+    def __init__(self):
+        self.batcher = MicroBatcher(lambda batch: batch * 2, max_batch=4, max_wait_ms=1, name="fake")
+
+
+class _FakeRegistry:
+    def __init__(self):
+        self.detector = _FakeDetector()
+
+    def get(self, profile):
+        if profile != "fake":
+            raise ValueError(f"Unknown profile {profile!r}")
+        return self.detector
+
+
+def _serve_once(address, registry):
+    listener = Listener(address, family="AF_UNIX")
+
+    def run():
+        conn = listener.accept()
+        _handle(conn, registry)
+        listener.close()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_remote_batcher_round_trips_through_shared_memory(tmp_path):
+    address = str(tmp_path / "inference.sock")
+    _serve_once(address, _FakeRegistry())
+    remote = RemoteBatcher("fake", address=address)
+    try:
+        blobs = [np.full((1, 3, 4, 4), i, dtype=np.float32) for i in range(3)]
+        outputs = remote.submit_many(blobs)
+        assert [float(o[0, 0, 0, 0]) for o in outputs] == [0.0, 2.0, 4.0]
+        # A larger request grows the segment on the same connection
+        big = remote.submit(np.ones((1, 3, 16, 16), dtype=np.float32))
+        assert big.shape == (1, 3, 16, 16)
+        assert remote.stats()["images"] == 4
+        with pytest.raises(InferenceServerError):
+            remote._request(("stats", "other"))
+    finally:
+        remote.close()
+
+
+def test_unreachable_server_raises(tmp_path):
+    remote = RemoteBatcher("fake", address=str(tmp_path / "missing.sock"))
+    with pytest.raises(InferenceServerError):
+        remote.submit(np.zeros((1, 3, 2, 2), dtype=np.float32))
@@ -0,0 +1,41 @@
+import numpy as np
+from nudenet.nudenet import _postprocess
+
+from app.detector import all_labels, naughty_labels
+from app.detector.postprocess import has_detection_of
+
+NAUGHTY_IDS = [all_labels.index(label) for label in naughty_labels]
+
+
+def _synthetic_output(rng, anchors=400, hot=12, size=320):
+    out = np.zeros((1, 4 + len(all_labels), anchors), dtype=np.float32)
+    out[0, 0:2] = rng.uniform(0, size, (2, anchors))
+    out[0, 2:4] = rng.uniform(4, size / 2, (2, anchors))
+    out[0, 4:] = rng.uniform(0, 0.15, (len(all_labels), anchors))
+    # A few confident anchors, some clustered so NMS has work to do
+    for i in rng.choice(anchors, hot, replace=False):
+        out[0, 4 + rng.integers(len(all_labels)), i] = rng.uniform(0.2, 0.95)
+        if rng.random() < 0.5:
+            j = rng.integers(anchors)
+            out[0, 0:4, j] = out[0, 0:4, i] + rng.uniform(-3, 3, 4)
+    return out
+
+
+def test_verdict_matches_full_postprocess():
+    rng = np.random.default_rng(1234)
+    for trial in range(300):
+        output = _synthetic_output(rng, hot=int(rng.integers(1, 8)))
+        width, height = int(rng.integers(100, 900)), int(rng.integers(100, 900))
+        side = max(width, height)
+        x_pad, y_pad = side - width, side - height
+        detections = _postprocess(
+            [output], x_pad, y_pad, side / width, side / height, width, height, 320, 320
+        )
+        expected = any(d["class"] in naughty_labels for d in detections)
+        got = has_detection_of([output], NAUGHTY_IDS, x_pad, y_pad, width, height, 320, 320)
+        assert got == expected, trial
+
+
+def test_no_confident_anchor_is_not_nude():
+    output = np.zeros((1, 4 + len(all_labels), 50), dtype=np.float32)
+    assert not has_detection_of([output], NAUGHTY_IDS, 0, 0, 320, 320, 320, 320)
@@ -0,0 +1,72 @@
+import threading
+import time
+
+from app.detector.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+    results = []
+    start = threading.Event()
+
+    def work():
+        calls.append(1)
+        time.sleep(0.05)
+        return {"nude": False}
+
+    def call():
+        start.wait()
+        results.append(flight.do("same", work))
+
+    threads = [threading.Thread(target=call) for _ in range(10)]
+    for t in threads:
+        t.start()
+    start.set()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert results == [{"nude": False}] * 10
+    stats = flight.stats()
+    assert stats["leaders"] == 1
+    assert stats["coalesced"] == 9
+    assert stats["in_flight"] == 0
+
+
+def test_errors_propagate_and_do_not_stick():
+    flight = SingleFlight()
+
+    def boom():
+        raise ValueError("bad image")
+
+    try:
+        flight.do("k", boom)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("expected ValueError")
+    assert flight.do("k", lambda: 1) == 1
+
+
+def test_lock_dir_waiter_rechecks_before_running(tmp_path):
+    first = SingleFlight(lock_dir=str(tmp_path))
+    second = SingleFlight(lock_dir=str(tmp_path))
+    shared = {}
+    ran = []
+    entered = threading.Event()
+
+    def slow():
+        entered.set()
+        time.sleep(0.1)
+        shared["k"] = "result"
+        ran.append("first")
+        return "result"
+
+    t = threading.Thread(target=lambda: first.do("k", slow))
+    t.start()
+    entered.wait()
+    assert second.do("k", lambda: ran.append("second"), recheck=lambda: shared.get("k")) == "result"
+    t.join()
+    assert ran == ["first"]
+    assert second.stats()["shared_hits"] == 1
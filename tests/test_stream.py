@@ -0,0 +1,61 @@
+import base64
+import json
+
+from fastapi.testclient import TestClient
+
+from app.detector import detect
+from app.main import app
+
+client = TestClient(app)
+
+
+def _samples():
+    datas = []
+    for i in (1, 2, 3):
+        with open(f"tests/fixtures/nude_sample_{i}.jpg", "rb") as f:
+            datas.append(f.read())
+    return datas
+
+
+def test_detect_stream_emits_one_line_per_image():
+    datas = _samples()
+    files = [("files", (f"{i}.jpg", d, "image/jpeg")) for i, d in enumerate(datas[:2])]
+    files.append(("files", ("bad.jpg", b"not an image", "image/jpeg")))
+    response = client.post(
+        "/api/detect_stream",
+        files=files,
+        data={"file_b64": "data:image/jpeg;base64," + base64.b64encode(datas[2]).decode()},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[-1] == {"done": True, "count": 4}
+    by_index = {line["index"]: line for line in lines[:-1]}
+    assert sorted(by_index) == [0, 1, 2, 3]
+    # Multipart sends form fields before files
+    assert by_index[0]["detections"] == detect(datas[2])
+    assert by_index[1]["detections"] == detect(datas[0])
+    assert by_index[2]["detections"] == detect(datas[1])
+    assert "error" in by_index[3]
+
+
+def test_isnude_stream_sse():
+    datas = _samples()
+    response = client.post(
+        "/api/isnude_stream?format=sse",
+        files=[("files", (f"{i}.jpg", d, "image/jpeg")) for i, d in enumerate(datas)],
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = [block.split("\n") for block in response.text.strip().split("\n\n")]
+    assert [e[0] for e in events] == ["event: result"] * 3 + ["event: done"]
+    results = [json.loads(e[1][len("data: "):]) for e in events[:-1]]
+    assert sorted(r["index"] for r in results) == [0, 1, 2]
+    assert all(isinstance(r["nude"], bool) for r in results)
+
+
+def test_stream_requires_multipart():
+    response = client.post("/api/detect_stream", content=b"{}", headers={"content-type": "application/json"})
+    assert response.status_code == 422